@@ -16,13 +16,46 @@ GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama2")
 
+# Chat scheduling: concurrent LLM calls, queue bounds and end-to-end deadline (seconds, queue wait
+# plus the LLM call); keep the deadline below client timeouts so no call runs for a client that gave up
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "1"))
+CHAT_QUEUE_MAX_DEPTH = int(os.getenv("CHAT_QUEUE_MAX_DEPTH", "32"))
+CHAT_QUEUE_MAX_PER_CLIENT = int(os.getenv("CHAT_QUEUE_MAX_PER_CLIENT", "4"))
+CHAT_REQUEST_DEADLINE = float(os.getenv("CHAT_REQUEST_DEADLINE", "90"))
+
 # ChromaDB settings
 CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", "./data/chroma_db")
 COLLECTION_NAME = "jarvis_knowledge"
 
+# Vector store backend: "chroma" or "mmap"
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+
+# Memory-mapped store settings
+MMAP_STORE_DIR = os.getenv("MMAP_STORE_DIR", "./data/mmap_store")
+MMAP_IVF_MIN_DOCS = int(os.getenv("MMAP_IVF_MIN_DOCS", "50000"))
+MMAP_IVF_NPROBE = int(os.getenv("MMAP_IVF_NPROBE", "8"))
+
+# Retrieval result cache: max entries (0 disables), TTL in seconds (0 = until the next write)
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024"))
+RETRIEVAL_CACHE_TTL = float(os.getenv("RETRIEVAL_CACHE_TTL", "300"))
+RETRIEVAL_CACHE_BUCKET_PRECISION = int(os.getenv("RETRIEVAL_CACHE_BUCKET_PRECISION", "2"))
+# Optional query log used to warm the cache at startup
+RETRIEVAL_CACHE_WARM_LOG = os.getenv("RETRIEVAL_CACHE_WARM_LOG", "")
+RETRIEVAL_CACHE_WARM_LIMIT = int(os.getenv("RETRIEVAL_CACHE_WARM_LIMIT", "200"))
+
+# Snapshot settings
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "./data/snapshots")
+SNAPSHOT_BATCH_SIZE = int(os.getenv("SNAPSHOT_BATCH_SIZE", "5000"))
+
 # Embedding model
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"
 
+# Query log: opt-in capture of queries, retrieved IDs and timings for offline replay
+QUERY_LOG_ENABLED = os.getenv("QUERY_LOG_ENABLED", "false").lower() in ("1", "true", "yes")
+QUERY_LOG_PATH = os.getenv("QUERY_LOG_PATH", "./data/query_log.jsonl")
+QUERY_LOG_MAX_BYTES = int(os.getenv("QUERY_LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+QUERY_LOG_BACKUP_COUNT = int(os.getenv("QUERY_LOG_BACKUP_COUNT", "5"))
+
 # API settings
 API_HOST = "0.0.0.0"
 API_PORT = 8000
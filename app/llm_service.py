@@ -1,5 +1,6 @@
 """LLM Service module for interacting with Gemini or Ollama"""
 
+import time
 import requests
 from typing import Optional, List, Dict
 
@@ -10,6 +11,9 @@ from app.config import (
 )
 from app.vector_store import vector_store
 
+# Documents retrieved as context for each query
+CONTEXT_RESULTS = 3
+
 
 class LLMService:
     """Handles communication with Gemini or Ollama LLM"""
@@ -106,12 +110,13 @@ class LLMService:
     def generate_response(self, user_query: str, use_knowledge_base: bool = True) -> Dict:
         """Generate a response to user query, optionally using knowledge base context"""
 
+        started = time.perf_counter()
         context = ""
         retrieved_docs = []
 
         # Retrieve relevant context from knowledge base
         if use_knowledge_base:
-            search_results = vector_store.search(user_query, n_results=3)
+            search_results = vector_store.search(user_query, n_results=CONTEXT_RESULTS)
             if search_results:
                 retrieved_docs = search_results
                 context_parts = [result["document"] for result in search_results]
@@ -136,12 +141,18 @@ Based on the context provided (if relevant) and your knowledge, please provide a
 Please provide a helpful response."""
 
         # Generate response
+        retrieved_at = time.perf_counter()
         response = self._call_llm(prompt, system_prompt)
+        finished = time.perf_counter()
 
         return {
             "response": response,
             "context_used": bool(context),
-            "retrieved_documents": retrieved_docs
+            "retrieved_documents": retrieved_docs,
+            "timings": {
+                "retrieval_ms": (retrieved_at - started) * 1000,
+                "llm_ms": (finished - retrieved_at) * 1000
+            }
         }
 
     def check_status(self) -> Dict:
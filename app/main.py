@@ -1,20 +1,30 @@
 """FastAPI Backend for Jarvis AI Assistant"""
 
 import os
-from fastapi import FastAPI, HTTPException
+import threading
+import time
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
 from pydantic import BaseModel
 from typing import List, Optional
 
-from app.llm_service import llm_service
+from app.config import SNAPSHOT_DIR, RETRIEVAL_CACHE_WARM_LOG, RETRIEVAL_CACHE_WARM_LIMIT
+from app.llm_service import CONTEXT_RESULTS, llm_service
+from app.query_log import query_logger
+from app.retrieval_cache import warm_from_log
+from app.scheduler import PRIORITIES, SchedulerRejected, chat_scheduler
+from app.snapshot import list_snapshots
+from app.static_assets import StaticAssetCache
 from app.vector_store import vector_store
 
 # Get the project root directory
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 FRONTEND_DIR = os.path.join(BASE_DIR, "frontend")
 
+# Frontend files are read and compressed once at startup
+static_assets = StaticAssetCache(FRONTEND_DIR)
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Jarvis AI Assistant",
@@ -32,10 +42,22 @@ app.add_middleware(
 )
 
 
+@app.on_event("startup")
+def warm_retrieval_cache():
+    """Precompute results for the hottest logged queries without delaying startup"""
+    if RETRIEVAL_CACHE_WARM_LOG:
+        threading.Thread(
+            target=warm_from_log,
+            args=(vector_store, RETRIEVAL_CACHE_WARM_LOG, RETRIEVAL_CACHE_WARM_LIMIT),
+            daemon=True
+        ).start()
+
+
 # Pydantic models for request/response
 class ChatRequest(BaseModel):
     message: str
     use_knowledge_base: bool = True
+    priority: str = "interactive"
 
 
 class ChatResponse(BaseModel):
@@ -49,6 +71,10 @@ class KnowledgeRequest(BaseModel):
     metadatas: Optional[List[dict]] = None
 
 
+class SnapshotRequest(BaseModel):
+    name: Optional[str] = None
+
+
 class StatusResponse(BaseModel):
     provider: str
     model: str
@@ -63,8 +89,7 @@ class StatusResponse(BaseModel):
 async def get_status():
     """Get system status including LLM provider and knowledge base"""
     llm_status = llm_service.check_status()
-    kb_docs = vector_store.get_all_documents()
-    kb_count = len(kb_docs.get("ids", [])) if kb_docs else 0
+    kb_count = vector_store.count()
 
     return StatusResponse(
         provider=llm_status.get("provider", "unknown"),
@@ -77,16 +102,66 @@ async def get_status():
 
 
 @app.post("/api/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request):
     """Send a message to Jarvis and get a response"""
     if not request.message.strip():
         raise HTTPException(status_code=400, detail="Message cannot be empty")
+    if request.priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"Priority must be one of: {', '.join(PRIORITIES)}")
 
-    result = llm_service.generate_response(
-        user_query=request.message,
-        use_knowledge_base=request.use_knowledge_base
+    # Clients can identify themselves explicitly; otherwise fairness is per remote address
+    client_id = http_request.headers.get("X-Client-ID") or (
+        http_request.client.host if http_request.client else "anonymous"
     )
 
+    # Logged here rather than in LLMService so the record covers queue wait and rejections
+    log_record = {
+        "kind": "chat",
+        "query": request.message,
+        "use_knowledge_base": request.use_knowledge_base,
+        "n_results": CONTEXT_RESULTS,
+        "client_id": client_id,
+        "priority": request.priority,
+        "provider": llm_service.provider,
+        # Arrival time, so a replay reproduces bursts rather than completion order
+        "ts": time.time()
+    }
+    started = time.perf_counter()
+    try:
+        result = await chat_scheduler.submit(
+            llm_service.generate_response,
+            request.message,
+            request.use_knowledge_base,
+            client_id=client_id,
+            priority=request.priority
+        )
+    except SchedulerRejected as e:
+        query_logger.log({
+            **log_record,
+            "status": e.status_code,
+            "retrieved_ids": [],
+            "timings": {"total_ms": (time.perf_counter() - started) * 1000}
+        })
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=e.detail,
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+    total_ms = (time.perf_counter() - started) * 1000
+    timings = result["timings"]
+    query_logger.log({
+        **log_record,
+        "status": 200,
+        "retrieved_ids": [doc.get("id") for doc in result["retrieved_documents"]],
+        "timings": {
+            "queue_ms": max(0.0, total_ms - timings["retrieval_ms"] - timings["llm_ms"]),
+            "retrieval_ms": timings["retrieval_ms"],
+            "llm_ms": timings["llm_ms"],
+            "total_ms": total_ms
+        }
+    })
+
     return ChatResponse(
         response=result["response"],
         context_used=result["context_used"],
@@ -94,6 +169,12 @@ async def chat(request: ChatRequest):
     )
 
 
+@app.get("/api/queue")
+async def get_queue_stats():
+    """Get chat queue depth, wait times and admission counters"""
+    return chat_scheduler.stats()
+
+
 @app.post("/api/knowledge/add")
 async def add_knowledge(request: KnowledgeRequest):
     """Add documents to the knowledge base"""
@@ -112,11 +193,14 @@ async def add_knowledge(request: KnowledgeRequest):
 
 
 @app.get("/api/knowledge")
-async def get_knowledge():
-    """Get all documents from knowledge base"""
-    docs = vector_store.get_all_documents()
+async def get_knowledge(limit: Optional[int] = None, offset: Optional[int] = None):
+    """Get documents from knowledge base, optionally one page at a time"""
+    if (limit is not None and limit < 1) or (offset is not None and offset < 0):
+        raise HTTPException(status_code=400, detail="Invalid pagination parameters")
+
+    docs = vector_store.get_all_documents(limit=limit, offset=offset)
     return {
-        "count": len(docs.get("ids", [])),
+        "count": vector_store.count() if limit is not None or offset else len(docs.get("ids", [])),
         "documents": docs
     }
 
@@ -144,24 +228,105 @@ async def clear_knowledge():
 @app.post("/api/knowledge/search")
 async def search_knowledge(query: str, n_results: int = 3):
     """Search the knowledge base"""
+    arrived_at = time.time()
+    started = time.perf_counter()
     results = vector_store.search(query, n_results)
+    query_logger.log({
+        "ts": arrived_at,
+        "kind": "search",
+        "query": query,
+        "n_results": n_results,
+        "status": 200,
+        "retrieved_ids": [result.get("id") for result in results],
+        "timings": {"total_ms": (time.perf_counter() - started) * 1000}
+    })
     return {"results": results}
 
 
+@app.get("/api/knowledge/cache")
+async def get_cache_stats():
+    """Get search result cache statistics"""
+    return vector_store.result_cache.stats()
+
+
+@app.post("/api/knowledge/cache/warm")
+def warm_cache():
+    """Precompute search results for the hottest queries in the configured query log"""
+    if not RETRIEVAL_CACHE_WARM_LOG or not os.path.exists(RETRIEVAL_CACHE_WARM_LOG):
+        raise HTTPException(status_code=404, detail="No query log configured for cache warming")
+    warmed = warm_from_log(vector_store, RETRIEVAL_CACHE_WARM_LOG, RETRIEVAL_CACHE_WARM_LIMIT)
+    return {"message": f"Warmed cache with {warmed} queries", "count": warmed}
+
+
+def _snapshot_path(name: str) -> str:
+    """Resolve a snapshot name to a path inside the snapshot directory"""
+    if not name or os.path.basename(name) != name or name.startswith(".") or name.endswith(".tmp"):
+        raise HTTPException(status_code=400, detail="Invalid snapshot name")
+    return os.path.join(SNAPSHOT_DIR, name)
+
+
+@app.get("/api/knowledge/snapshots")
+async def get_snapshots():
+    """List available knowledge base snapshots"""
+    return {"snapshots": list_snapshots(SNAPSHOT_DIR)}
+
+
+# Snapshot, restore and compact can run for minutes, so they are plain functions that
+# FastAPI runs in its threadpool instead of on the event loop
+@app.post("/api/knowledge/snapshot")
+def create_snapshot(request: SnapshotRequest):
+    """Export the knowledge base, including embeddings, to a snapshot"""
+    name = request.name or time.strftime("snapshot_%Y%m%d_%H%M%S")
+    path = _snapshot_path(name)
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+
+    manifest = vector_store.export_snapshot(path)
+    if manifest is None:
+        raise HTTPException(status_code=500, detail="Failed to create snapshot")
+    return {"message": f"Successfully created snapshot {name}", "name": name, **manifest}
+
+
+@app.post("/api/knowledge/restore")
+def restore_snapshot(request: SnapshotRequest):
+    """Replace the knowledge base with a snapshot without re-embedding"""
+    if not request.name:
+        raise HTTPException(status_code=400, detail="Snapshot name is required")
+    path = _snapshot_path(request.name)
+    if not os.path.isdir(path):
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+
+    result = vector_store.restore_snapshot(path)
+    if result is None:
+        raise HTTPException(status_code=500, detail="Failed to restore snapshot")
+    return {"message": f"Successfully restored {result['count']} documents from {request.name}", **result}
+
+
+@app.post("/api/knowledge/compact")
+def compact_knowledge():
+    """Rebuild the knowledge base index and reclaim space left by deletes"""
+    result = vector_store.compact()
+    if result is None:
+        raise HTTPException(status_code=500, detail="Failed to compact knowledge base")
+    return {"message": f"Successfully compacted knowledge base ({result['count']} documents)", **result}
+
+
 # Serve frontend static files
 @app.get("/")
-async def serve_index():
+async def serve_index(request: Request):
     """Serve the main frontend page"""
-    return FileResponse(os.path.join(FRONTEND_DIR, "index.html"))
+    response = static_assets.response("index.html", request)
+    if response is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    return response
 
 
 @app.get("/{filename}")
-async def serve_static(filename: str):
+async def serve_static(filename: str, request: Request):
     """Serve static files (css, js)"""
-    file_path = os.path.join(FRONTEND_DIR, filename)
-    if os.path.exists(file_path):
-        return FileResponse(file_path)
-    raise HTTPException(status_code=404, detail="File not found")
+    response = static_assets.response(filename, request)
+    if response is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    return response
 
 
 if __name__ == "__main__":
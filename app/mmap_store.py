@@ -0,0 +1,517 @@
+"""Memory-mapped vector store with exact NumPy search and an optional IVF index"""
+
+import json
+import os
+import threading
+import numpy as np
+from contextlib import contextmanager
+from sentence_transformers import SentenceTransformer
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.config import (
+    EMBEDDING_MODEL, MMAP_STORE_DIR, MMAP_IVF_MIN_DOCS, MMAP_IVF_NPROBE,
+    SNAPSHOT_BATCH_SIZE
+)
+from app.retrieval_cache import RetrievalCache
+from app.snapshot import SnapshotWriter, iter_snapshot, validate_snapshot
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; writes are then only serialized within a process
+    fcntl = None
+
+EMBEDDINGS_FILE = "embeddings.f32"
+RECORDS_FILE = "records.jsonl"
+LOCK_FILE = "store.lock"
+INITIAL_CAPACITY = 1024
+KMEANS_ITERATIONS = 10
+ASSIGN_CHUNK_SIZE = 65536
+
+
+class IVFIndex:
+    """Inverted-file index: spherical k-means centroids and the rows assigned to each list"""
+
+    def __init__(self, embeddings: np.ndarray, alive: np.ndarray, nprobe: int):
+        rows = np.flatnonzero(alive)
+        # Rows added after the index was built are searched exhaustively
+        self.indexed_count = len(alive)
+        self.nprobe = nprobe
+
+        n_lists = max(1, int(np.sqrt(len(rows))))
+        self.centroids = self._train(embeddings, rows, n_lists)
+        assignments = self._assign(embeddings, rows)
+        order = np.argsort(assignments, kind="stable")
+        self.rows = rows[order]
+        self.offsets = np.searchsorted(assignments[order], np.arange(n_lists + 1))
+
+    def _train(self, embeddings: np.ndarray, rows: np.ndarray, n_lists: int) -> np.ndarray:
+        """Train centroids on a sample of the live rows"""
+        rng = np.random.default_rng(0)
+        sample_size = min(len(rows), n_lists * 64)
+        sample = np.asarray(embeddings[np.sort(rng.choice(rows, sample_size, replace=False))])
+        centroids = sample[:n_lists].copy()
+
+        for _ in range(KMEANS_ITERATIONS):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for i in range(n_lists):
+                members = sample[labels == i]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    centroids[i] = centroid / max(np.linalg.norm(centroid), 1e-12)
+        return centroids
+
+    def _assign(self, embeddings: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """Assign every row to its nearest centroid"""
+        assignments = np.empty(len(rows), dtype=np.int64)
+        for start in range(0, len(rows), ASSIGN_CHUNK_SIZE):
+            chunk = rows[start:start + ASSIGN_CHUNK_SIZE]
+            assignments[start:start + len(chunk)] = np.argmax(embeddings[chunk] @ self.centroids.T, axis=1)
+        return assignments
+
+    def candidates(self, query: np.ndarray, count: int) -> np.ndarray:
+        """Rows to score for a query: the nearest lists plus any rows added since the build"""
+        scores = self.centroids @ query
+        nprobe = min(self.nprobe, len(scores))
+        lists = np.argpartition(-scores, nprobe - 1)[:nprobe]
+        parts = [self.rows[self.offsets[i]:self.offsets[i + 1]] for i in lists]
+        parts.append(np.arange(self.indexed_count, count))
+        return np.concatenate(parts)
+
+
+class MmapVectorStore:
+    """Stores float32 embeddings in a memory-mapped array with an id/metadata sidecar
+
+    The sidecar is an append-only JSONL log of add/delete operations. Other processes map
+    the same embeddings file and pick up new log entries on each call, so several API
+    workers can share the data without copies. Writers hold an exclusive lock on a lock
+    file in the store directory; readers take a shared lock while applying new entries.
+    """
+
+    def __init__(self, path: str = MMAP_STORE_DIR):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.embeddings_path = os.path.join(path, EMBEDDINGS_FILE)
+        self.records_path = os.path.join(path, RECORDS_FILE)
+
+        # Initialize embedding model
+        self.embedding_model = SentenceTransformer(EMBEDDING_MODEL)
+        self.dimension = self.embedding_model.get_sentence_embedding_dimension()
+
+        self._lock = threading.RLock()
+        self._index_lock = threading.Lock()
+        self._lock_file = open(os.path.join(path, LOCK_FILE), "a+b")
+        self._write_depth = 0
+        self._generation = 0
+
+        # Search results are cached until the next change, including changes from other processes
+        self.result_cache = RetrievalCache()
+
+        with self._write_lock():
+            if not os.path.exists(self.embeddings_path) or not os.path.exists(self.records_path):
+                self._write_files([], 0)
+            else:
+                self._load()
+
+    @contextmanager
+    def _write_lock(self):
+        """Hold the thread lock and, across processes, an exclusive lock on the store"""
+        with self._lock:
+            if self._write_depth == 0 and fcntl is not None:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            self._write_depth += 1
+            try:
+                yield
+            finally:
+                self._write_depth -= 1
+                if self._write_depth == 0 and fcntl is not None:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _get_embeddings(self, texts: List[str]) -> np.ndarray:
+        """Generate unit-length float32 embeddings for given texts"""
+        embeddings = self.embedding_model.encode(texts, normalize_embeddings=True)
+        return np.asarray(embeddings, dtype=np.float32)
+
+    def _map(self) -> None:
+        """(Re)map the embeddings file and grow the liveness mask to match"""
+        capacity = os.path.getsize(self.embeddings_path) // (self.dimension * 4)
+        self._embeddings = np.memmap(
+            self.embeddings_path, dtype=np.float32, mode="r+", shape=(capacity, self.dimension)
+        )
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:len(self._alive)] = self._alive[:capacity]
+        self._alive = alive
+
+    def _load(self) -> None:
+        """Rebuild in-memory state from the files on disk"""
+        self.ids: List[Optional[str]] = []
+        self.documents: List[Optional[str]] = []
+        self.metadatas: List[Optional[Dict]] = []
+        self.id_to_row: Dict[str, int] = {}
+        self.row_count = 0
+        self._alive = np.zeros(0, dtype=bool)
+        self._index: Optional[IVFIndex] = None
+        # Rows are renumbered on every load, so an index built before one is discarded
+        self._generation += 1
+        self._map()
+
+        self._records_inode = os.stat(self.records_path).st_ino
+        self._records_offset = 0
+        self._read_records()
+        self.result_cache.bump()
+
+    def _read_records(self) -> None:
+        """Apply log entries appended since the last read"""
+        with open(self.records_path, "rb") as f:
+            f.seek(self._records_offset)
+            data = f.read()
+
+        # Ignore a trailing partial line the writer has not finished yet
+        end = data.rfind(b"\n") + 1
+        if end == 0:
+            return
+        for line in data[:end].splitlines():
+            self._apply(json.loads(line))
+        self._records_offset += end
+        self.result_cache.bump()
+
+    def _apply(self, record: Dict) -> None:
+        """Apply a single log entry to the in-memory state"""
+        if record["op"] == "add":
+            row = self.row_count
+            self.ids.append(record["id"])
+            self.documents.append(record["document"])
+            self.metadatas.append(record["metadata"])
+            self.id_to_row[record["id"]] = row
+            if row >= len(self._alive):
+                self._map()
+            self._alive[row] = True
+            self.row_count += 1
+        elif record["op"] == "delete":
+            row = self.id_to_row.pop(record["id"], None)
+            if row is not None:
+                self._alive[row] = False
+                self.ids[row] = None
+                self.documents[row] = None
+                self.metadatas[row] = None
+
+    def _changed(self) -> bool:
+        """Whether the records file differs from what has been applied"""
+        try:
+            stat = os.stat(self.records_path)
+        except FileNotFoundError:
+            return False
+        return stat.st_ino != self._records_inode or stat.st_size != self._records_offset
+
+    def _refresh(self) -> None:
+        """Pick up changes made by other processes sharing the store; call with _lock held"""
+        if not self._changed():
+            return
+        # A shared lock keeps a writer from swapping files while they are being read
+        shared = self._write_depth == 0 and fcntl is not None
+        if shared:
+            fcntl.flock(self._lock_file, fcntl.LOCK_SH)
+        try:
+            stat = os.stat(self.records_path)
+            if stat.st_ino != self._records_inode or stat.st_size < self._records_offset:
+                self._load()
+            elif stat.st_size > self._records_offset:
+                self._read_records()
+        finally:
+            if shared:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _append_records(self, records: List[Dict]) -> None:
+        """Append log entries and apply them locally; call with _write_lock held after _refresh"""
+        data = "".join(json.dumps(record) + "\n" for record in records).encode("utf-8")
+        with open(self.records_path, "ab") as f:
+            f.write(data)
+            self._records_offset = f.tell()
+        for record in records:
+            self._apply(record)
+        self.result_cache.bump()
+
+    def _ensure_capacity(self, rows: int) -> None:
+        """Grow the embeddings file so it can hold at least `rows` rows"""
+        capacity = self._embeddings.shape[0]
+        if rows <= capacity:
+            return
+        self._embeddings.flush()
+        os.truncate(self.embeddings_path, max(rows, capacity * 2) * self.dimension * 4)
+        self._map()
+
+    def _write_files(self, batches: Iterable[Tuple[List[str], List[str], List[Optional[Dict]], np.ndarray]], count: int) -> int:
+        """Write a fresh pair of files from batches of rows and swap them into place"""
+        tmp_embeddings_path = f"{self.embeddings_path}.tmp"
+        tmp_records_path = f"{self.records_path}.tmp"
+
+        embeddings = np.memmap(
+            tmp_embeddings_path, dtype=np.float32, mode="w+",
+            shape=(max(INITIAL_CAPACITY, count), self.dimension)
+        )
+        row = 0
+        with open(tmp_records_path, "w", encoding="utf-8") as f:
+            for ids, documents, metadatas, batch_embeddings in batches:
+                embeddings[row:row + len(ids)] = batch_embeddings
+                for i in range(len(ids)):
+                    f.write(json.dumps({
+                        "op": "add",
+                        "id": ids[i],
+                        "document": documents[i],
+                        "metadata": metadatas[i]
+                    }) + "\n")
+                row += len(ids)
+        embeddings.flush()
+        del embeddings
+
+        # Embeddings first: readers reload when they see the records file change
+        self._embeddings = None
+        os.replace(tmp_embeddings_path, self.embeddings_path)
+        os.replace(tmp_records_path, self.records_path)
+        self._load()
+        return row
+
+    def _live_batches(self) -> Iterable[Tuple[List[str], List[str], List[Optional[Dict]], np.ndarray]]:
+        """Yield the live rows in insertion order, in batches"""
+        rows = np.flatnonzero(self._alive[:self.row_count])
+        for start in range(0, len(rows), SNAPSHOT_BATCH_SIZE):
+            batch = rows[start:start + SNAPSHOT_BATCH_SIZE]
+            yield (
+                [self.ids[row] for row in batch],
+                [self.documents[row] for row in batch],
+                [self.metadatas[row] for row in batch],
+                np.asarray(self._embeddings[batch])
+            )
+
+    def _build_index(self, embeddings: np.ndarray, alive: np.ndarray, generation: int) -> None:
+        """Build an IVF index in the background and swap it in if the rows were not renumbered"""
+        try:
+            index = IVFIndex(embeddings, alive, MMAP_IVF_NPROBE)
+            with self._lock:
+                if self._generation == generation:
+                    self._index = index
+        except Exception as e:
+            print(f"Error building IVF index: {e}")
+        finally:
+            self._index_lock.release()
+
+    def _index_for_search(self, embeddings: np.ndarray, alive: np.ndarray, count: int, generation: int) -> Optional[IVFIndex]:
+        """Return the current IVF index, starting a rebuild once enough rows have been added
+
+        Called with _lock held. The build runs in a background thread; searches keep using
+        the stale index, or exact search, until it is swapped in.
+        """
+        if MMAP_IVF_MIN_DOCS <= 0 or len(self.id_to_row) < MMAP_IVF_MIN_DOCS:
+            return None
+
+        index = self._index
+        if index is None or count - index.indexed_count > index.indexed_count // 10:
+            # Only one build runs at a time
+            if self._index_lock.acquire(blocking=False):
+                threading.Thread(
+                    target=self._build_index,
+                    args=(embeddings[:count], alive[:count].copy(), generation),
+                    daemon=True
+                ).start()
+        return index
+
+    def _generate_ids(self, n: int) -> List[str]:
+        """Generate IDs that are not in use
+
+        Compaction and restore renumber rows, so the row count alone can collide with a live ID.
+        """
+        ids = []
+        next_id = self.row_count
+        while len(ids) < n:
+            candidate = f"doc_{next_id}"
+            next_id += 1
+            if candidate not in self.id_to_row:
+                ids.append(candidate)
+        return ids
+
+    def add_knowledge(self, documents: List[str], metadatas: Optional[List[Dict]] = None, ids: Optional[List[str]] = None) -> bool:
+        """Add documents to the knowledge base; existing ids are replaced"""
+        try:
+            if metadatas is None:
+                metadatas = [{"source": "user_input"} for _ in documents]
+
+            # Generate embeddings
+            embeddings = self._get_embeddings(documents)
+
+            with self._write_lock():
+                self._refresh()
+                if ids is None:
+                    ids = self._generate_ids(len(documents))
+                elif len(set(ids)) != len(ids):
+                    # Keep only the last occurrence of a repeated ID, as a later add would replace it
+                    keep = sorted({doc_id: i for i, doc_id in enumerate(ids)}.values())
+                    ids = [ids[i] for i in keep]
+                    documents = [documents[i] for i in keep]
+                    metadatas = [metadatas[i] for i in keep]
+                    embeddings = embeddings[keep]
+
+                start = self.row_count
+                self._ensure_capacity(start + len(documents))
+                self._embeddings[start:start + len(documents)] = embeddings
+                self._embeddings.flush()
+
+                records = [{"op": "delete", "id": doc_id} for doc_id in ids if doc_id in self.id_to_row]
+                records += [
+                    {"op": "add", "id": ids[i], "document": documents[i], "metadata": metadatas[i]}
+                    for i in range(len(documents))
+                ]
+                self._append_records(records)
+            return True
+        except Exception as e:
+            print(f"Error adding knowledge: {e}")
+            return False
+
+    @staticmethod
+    def _matches(metadata: Optional[Dict], where: Dict) -> bool:
+        """Check a row's metadata against an equality filter"""
+        return metadata is not None and all(metadata.get(key) == value for key, value in where.items())
+
+    def _embed_query(self, query: str) -> np.ndarray:
+        """Generate the embedding for a single query"""
+        return self._get_embeddings([query])[0]
+
+    def _query(self, query_embedding: np.ndarray, n_results: int, where: Optional[Dict]) -> List[Dict]:
+        """Score the live rows (or the IVF candidates) against a query embedding"""
+        if where and any(key.startswith("$") or isinstance(value, dict) for key, value in where.items()):
+            raise ValueError("Only equality metadata filters are supported by the mmap backend")
+
+        # _load replaces these lists, so the references stay consistent with this memmap
+        with self._lock:
+            embeddings, alive, count = self._embeddings, self._alive, self.row_count
+            ids, documents, metadatas = self.ids, self.documents, self.metadatas
+            generation = self._generation
+            index = self._index_for_search(embeddings, alive, count, generation)
+
+        if index is not None:
+            rows = index.candidates(query_embedding, count)
+            scores = embeddings[rows] @ query_embedding
+            mask = alive[rows]
+        else:
+            rows = None
+            scores = embeddings[:count] @ query_embedding
+            mask = alive[:count]
+
+        if where:
+            candidate_rows = rows if rows is not None else range(count)
+            with self._lock:
+                mask = mask & np.fromiter(
+                    (self._matches(metadatas[row], where) for row in candidate_rows),
+                    dtype=bool, count=len(candidate_rows)
+                )
+
+        scores = np.where(mask, scores, -np.inf)
+        k = min(n_results, int(mask.sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        # Format results; distance is squared L2 on unit vectors, matching Chroma's default space
+        formatted_results = []
+        with self._lock:
+            for i in top:
+                row = int(rows[i]) if rows is not None else int(i)
+                if documents[row] is None:
+                    continue
+                formatted_results.append({
+                    "id": ids[row],
+                    "document": documents[row],
+                    "metadata": metadatas[row] or {},
+                    "distance": float(2.0 - 2.0 * scores[i])
+                })
+
+        return formatted_results
+
+    def search(self, query: str, n_results: int = 3, where: Optional[Dict] = None) -> List[Dict]:
+        """Search for relevant documents based on query, optionally filtered by metadata"""
+        try:
+            with self._lock:
+                self._refresh()
+            return self.result_cache.get_or_compute(query, n_results, where, self._embed_query, self._query)
+        except Exception as e:
+            print(f"Error searching: {e}")
+            return []
+
+    def get_all_documents(self, limit: Optional[int] = None, offset: Optional[int] = None) -> Dict:
+        """Retrieve all documents from the knowledge base, optionally one page at a time"""
+        try:
+            with self._lock:
+                self._refresh()
+                rows = sorted(self.id_to_row.values())
+                start = offset or 0
+                rows = rows[start:start + limit] if limit is not None else rows[start:]
+                return {
+                    "ids": [self.ids[row] for row in rows],
+                    "documents": [self.documents[row] for row in rows],
+                    "metadatas": [self.metadatas[row] for row in rows]
+                }
+        except Exception as e:
+            print(f"Error retrieving documents: {e}")
+            return {}
+
+    def count(self) -> int:
+        """Return the number of documents in the knowledge base"""
+        with self._lock:
+            self._refresh()
+            return len(self.id_to_row)
+
+    def delete_document(self, doc_id: str) -> bool:
+        """Delete a document by ID"""
+        try:
+            with self._write_lock():
+                self._refresh()
+                if doc_id in self.id_to_row:
+                    self._append_records([{"op": "delete", "id": doc_id}])
+            return True
+        except Exception as e:
+            print(f"Error deleting document: {e}")
+            return False
+
+    def clear_all(self) -> bool:
+        """Clear all documents from the knowledge base"""
+        try:
+            with self._write_lock():
+                self._write_files([], 0)
+            return True
+        except Exception as e:
+            print(f"Error clearing knowledge base: {e}")
+            return False
+
+    def export_snapshot(self, path: str) -> Optional[Dict]:
+        """Write ids, documents, metadata and raw embeddings to a snapshot directory"""
+        try:
+            with self._lock:
+                self._refresh()
+                writer = SnapshotWriter(path, len(self.id_to_row))
+                for ids, documents, metadatas, embeddings in self._live_batches():
+                    writer.write_batch(ids, documents, metadatas, embeddings)
+                return writer.close()
+        except Exception as e:
+            print(f"Error exporting snapshot: {e}")
+            return None
+
+    def restore_snapshot(self, path: str) -> Optional[Dict]:
+        """Replace the knowledge base with a snapshot, reusing its stored embeddings"""
+        try:
+            manifest = validate_snapshot(path, self.dimension)
+            with self._write_lock():
+                restored = self._write_files(iter_snapshot(path, SNAPSHOT_BATCH_SIZE), manifest["count"])
+            return {"count": restored}
+        except Exception as e:
+            print(f"Error restoring snapshot: {e}")
+            return None
+
+    def compact(self) -> Optional[Dict]:
+        """Rewrite the files without deleted rows and drop the IVF index so it is rebuilt"""
+        try:
+            with self._write_lock():
+                self._refresh()
+                compacted = self._write_files(self._live_batches(), len(self.id_to_row))
+            return {"count": compacted}
+        except Exception as e:
+            print(f"Error compacting knowledge base: {e}")
+            return None
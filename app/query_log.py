@@ -0,0 +1,105 @@
+"""Opt-in query log written to rotating JSONL files from a background thread"""
+
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from typing import Dict, List
+
+from app.config import (
+    QUERY_LOG_ENABLED, QUERY_LOG_PATH, QUERY_LOG_MAX_BYTES, QUERY_LOG_BACKUP_COUNT
+)
+
+QUEUE_MAX_SIZE = 10000
+BATCH_SIZE = 256
+FLUSH_INTERVAL = 1.0  # seconds
+
+
+class QueryLogger:
+    """Buffers query records in memory and writes them in batches off the request path
+
+    `log()` only enqueues; if the writer falls behind and the queue fills up, records are
+    dropped and counted rather than slowing down requests.
+    """
+
+    def __init__(self, path: str = QUERY_LOG_PATH, enabled: bool = QUERY_LOG_ENABLED,
+                 max_bytes: int = QUERY_LOG_MAX_BYTES, backup_count: int = QUERY_LOG_BACKUP_COUNT):
+        self.path = path
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.dropped = 0
+        self._queue: "queue.Queue[Dict]" = queue.Queue(maxsize=QUEUE_MAX_SIZE)
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def log(self, record: Dict) -> None:
+        """Queue a record for writing"""
+        if not self.enabled:
+            return
+        if self._thread is None:
+            self._start()
+        record.setdefault("ts", time.time())
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self) -> None:
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._thread = threading.Thread(target=self._run, name="query-log-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def _run(self) -> None:
+        while True:
+            try:
+                records = [self._queue.get(timeout=FLUSH_INTERVAL)]
+            except queue.Empty:
+                continue
+            while len(records) < BATCH_SIZE:
+                try:
+                    records.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(records)
+            except Exception as e:
+                print(f"Error writing query log: {e}")
+            finally:
+                for _ in records:
+                    self._queue.task_done()
+
+    def _write(self, records: List[Dict]) -> None:
+        data = "".join(json.dumps(record) + "\n" for record in records).encode("utf-8")
+        if os.path.exists(self.path) and os.path.getsize(self.path) + len(data) > self.max_bytes:
+            self._rotate()
+        with open(self.path, "ab") as f:
+            f.write(data)
+
+    def _rotate(self) -> None:
+        """Shift query_log.jsonl -> .1 -> .2 ..., dropping the oldest"""
+        if self.backup_count <= 0:
+            os.remove(self.path)
+            return
+        for i in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def flush(self) -> None:
+        """Block until every queued record has been written"""
+        if self._thread is not None:
+            self._queue.join()
+
+
+# Singleton instance
+query_logger = QueryLogger()
@@ -0,0 +1,221 @@
+"""Replay a captured query log and compare latency and retrieval with the recorded run
+
+Usage:
+    python -m app.replay data/query_log.jsonl --target http://localhost:8000 --speedup 4
+    python -m app.replay data/query_log.jsonl --direct --stub-latency-ms 800
+"""
+
+import argparse
+import json
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+STUB_RESPONSE = "Stubbed response for replay."
+
+
+def load_records(paths: List[str], kinds: List[str], limit: Optional[int]) -> List[Dict]:
+    """Read query log records in timestamp order"""
+    records = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                if record.get("kind") in kinds and record.get("query"):
+                    records.append(record)
+    records.sort(key=lambda record: record.get("ts", 0))
+    return records[:limit] if limit else records
+
+
+def http_runner(target: str, concurrency: int) -> Callable[[Dict], Tuple[int, List[str]]]:
+    """Replay records against a running API instance, as the clients that sent them"""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    # One pooled connection per replay thread, so connection setup does not inflate latencies
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    def run(record: Dict) -> Tuple[int, List[str]]:
+        if record["kind"] == "chat":
+            response = session.post(
+                f"{target}/api/chat",
+                json={
+                    "message": record["query"],
+                    "use_knowledge_base": record.get("use_knowledge_base", True),
+                    "priority": record.get("priority", "interactive")
+                },
+                headers={"X-Client-ID": record.get("client_id") or "replay"},
+                timeout=300
+            )
+            key = "retrieved_documents"
+        else:
+            response = session.post(
+                f"{target}/api/knowledge/search",
+                params={"query": record["query"], "n_results": record.get("n_results", 3)},
+                timeout=60
+            )
+            key = "results"
+        if response.status_code != 200:
+            return response.status_code, []
+        return 200, [doc.get("id") for doc in response.json().get(key, [])]
+
+    return run
+
+
+def direct_runner(stub_latency_ms: float) -> Callable[[Dict], Tuple[int, List[str]]]:
+    """Replay records in-process against the vector store and LLM service with a stubbed provider
+
+    This bypasses the API and its chat queue, so it is compared against recorded service time.
+    """
+    from app.llm_service import llm_service
+    from app.vector_store import vector_store
+
+    def stub_llm(prompt: str, system_prompt: Optional[str] = None) -> str:
+        if stub_latency_ms:
+            time.sleep(stub_latency_ms / 1000)
+        return STUB_RESPONSE
+
+    llm_service._call_llm = stub_llm
+
+    def run(record: Dict) -> Tuple[int, List[str]]:
+        if record["kind"] == "chat":
+            documents = llm_service.generate_response(
+                record["query"], record.get("use_knowledge_base", True)
+            )["retrieved_documents"]
+        else:
+            documents = vector_store.search(record["query"], record.get("n_results", 3))
+        return 200, [doc.get("id") for doc in documents]
+
+    return run
+
+
+def recorded_latency(record: Dict, direct: bool) -> Optional[float]:
+    """The recorded latency comparable with a replay: end to end over HTTP, without queue wait in-process"""
+    timings = record.get("timings", {})
+    total_ms = timings.get("total_ms")
+    if total_ms is None or not direct:
+        return total_ms
+    return total_ms - timings.get("queue_ms", 0.0)
+
+
+def replay(records: List[Dict], run: Callable[[Dict], Tuple[int, List[str]]], speedup: float,
+           concurrency: int, direct: bool) -> List[Dict]:
+    """Issue records on their recorded schedule, compressed by `speedup` (0 = as fast as possible)"""
+
+    def timed(record: Dict) -> Tuple[float, Optional[int], List[str], Optional[str]]:
+        started = time.perf_counter()
+        try:
+            status, ids = run(record)
+            return (time.perf_counter() - started) * 1000, status, ids, None
+        except Exception as e:
+            return (time.perf_counter() - started) * 1000, None, [], str(e)
+
+    first_ts = records[0].get("ts", 0) if records else 0
+    started = time.perf_counter()
+    futures = []
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for record in records:
+            if speedup > 0:
+                delay = (record.get("ts", first_ts) - first_ts) / speedup - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            futures.append((record, executor.submit(timed, record)))
+
+    results = []
+    for record, future in futures:
+        latency_ms, status, ids, error = future.result()
+        results.append({
+            "kind": record["kind"],
+            "query": record["query"],
+            "client_id": record.get("client_id"),
+            "recorded_status": record.get("status", 200),
+            "replayed_status": status,
+            "recorded_ms": recorded_latency(record, direct),
+            "replayed_ms": latency_ms,
+            "recorded_ids": record.get("retrieved_ids", []),
+            "replayed_ids": ids,
+            "error": error
+        })
+    return results
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def _overlap(recorded: List[str], replayed: List[str]) -> float:
+    """Fraction of the recorded IDs that were retrieved again"""
+    if not recorded:
+        return 1.0 if not replayed else 0.0
+    return len(set(recorded) & set(replayed)) / len(set(recorded))
+
+
+def summarize(results: List[Dict]) -> Dict:
+    """Status counts, latency percentiles and retrieval overlap per record kind
+
+    Latency and overlap only cover requests that succeeded both when recorded and on replay,
+    so rejections on either side do not skew the comparison.
+    """
+    summary = {}
+    for kind in sorted({result["kind"] for result in results}):
+        rows = [result for result in results if result["kind"] == kind]
+        both_ok = [
+            result for result in rows
+            if result["recorded_status"] == 200 and result["replayed_status"] == 200
+        ]
+        recorded = [result["recorded_ms"] for result in both_ok if result["recorded_ms"] is not None]
+        replayed = [result["replayed_ms"] for result in both_ok]
+        overlaps = [_overlap(result["recorded_ids"], result["replayed_ids"]) for result in both_ok]
+        summary[kind] = {
+            "requests": len(rows),
+            "compared": len(both_ok),
+            "recorded_status": dict(Counter(str(result["recorded_status"]) for result in rows)),
+            "replayed_status": dict(Counter(str(result["replayed_status"] or "error") for result in rows)),
+            "recorded_ms": {f"p{p}": _percentile(recorded, p) for p in (50, 95, 99)},
+            "replayed_ms": {f"p{p}": _percentile(replayed, p) for p in (50, 95, 99)},
+            "mean_retrieval_overlap": sum(overlaps) / len(overlaps) if overlaps else None
+        }
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay a Jarvis query log and compare with the recorded run")
+    parser.add_argument("logs", nargs="+", help="Query log files (JSONL)")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--target", default="http://localhost:8000", help="Base URL of a running API")
+    mode.add_argument("--direct", action="store_true", help="Run in-process with a stubbed LLM provider")
+    parser.add_argument("--stub-latency-ms", type=float, default=0.0, help="Simulated LLM latency in --direct mode")
+    parser.add_argument("--speedup", type=float, default=1.0, help="Replay speed-up factor (0 = no delays)")
+    parser.add_argument("--concurrency", type=int, default=32, help="Maximum requests in flight across all clients")
+    parser.add_argument("--kind", action="append", choices=["chat", "search"], help="Record kinds to replay")
+    parser.add_argument("--limit", type=int, help="Replay at most this many records")
+    parser.add_argument("--output", help="Write per-request results to this JSONL file")
+    args = parser.parse_args()
+
+    records = load_records(args.logs, args.kind or ["chat", "search"], args.limit)
+    if not records:
+        raise SystemExit("No records to replay")
+
+    run = direct_runner(args.stub_latency_ms) if args.direct else http_runner(args.target.rstrip("/"), args.concurrency)
+    results = replay(records, run, args.speedup, args.concurrency, args.direct)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+
+    print(json.dumps(summarize(results), indent=2))
+
+
+if __name__ == "__main__":
+    main()
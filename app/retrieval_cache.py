@@ -0,0 +1,141 @@
+"""Search result cache keyed by query and embedding bucket, invalidated by a generation counter"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import numpy as np
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.config import RETRIEVAL_CACHE_SIZE, RETRIEVAL_CACHE_TTL, RETRIEVAL_CACHE_BUCKET_PRECISION
+
+
+class RetrievalCache:
+    """LRU cache of search results
+
+    Entries are looked up first by normalized query text, which skips the embedding model,
+    then by a rounded embedding bucket, which skips the index for near-identical queries.
+    Every entry records the generation it was computed in; `bump()` after any write makes
+    all older entries stale without having to find them.
+    """
+
+    def __init__(self, max_entries: int = RETRIEVAL_CACHE_SIZE, ttl: float = RETRIEVAL_CACHE_TTL,
+                 bucket_precision: int = RETRIEVAL_CACHE_BUCKET_PRECISION):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.bucket_scale = 10 ** bucket_precision
+        self.generation = 0
+        self._entries: "OrderedDict[Tuple, Tuple[int, float, List[Dict]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"text_hits": 0, "embedding_hits": 0, "misses": 0}
+
+    def bump(self) -> None:
+        """Invalidate every cached result after the collection changes"""
+        with self._lock:
+            self.generation += 1
+
+    @staticmethod
+    def _filters_key(where: Optional[Dict]) -> str:
+        return json.dumps(where, sort_keys=True) if where else ""
+
+    def _text_key(self, query: str, n_results: int, where: Optional[Dict]) -> Tuple:
+        return ("text", " ".join(query.lower().split()), n_results, self._filters_key(where))
+
+    def _embedding_key(self, embedding, n_results: int, where: Optional[Dict]) -> Tuple:
+        bucket = np.round(np.asarray(embedding, dtype=np.float32) * self.bucket_scale).astype(np.int32)
+        return ("embedding", hashlib.blake2b(bucket.tobytes(), digest_size=16).digest(), n_results, self._filters_key(where))
+
+    def _get(self, key: Tuple) -> Optional[List[Dict]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            generation, created_at, results = entry
+            if generation != self.generation or (self.ttl and time.monotonic() - created_at > self.ttl):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return results
+
+    def _put(self, key: Tuple, generation: int, results: List[Dict]) -> None:
+        with self._lock:
+            # A write landed while this result was computed; it may already be stale
+            if generation != self.generation:
+                return
+            self._entries[key] = (generation, time.monotonic(), results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, query: str, n_results: int, where: Optional[Dict],
+                       embed: Callable[[str], List[float]],
+                       search: Callable[[List[float], int, Optional[Dict]], List[Dict]]) -> List[Dict]:
+        """Return cached results, computing and caching them on a miss"""
+        if self.max_entries <= 0:
+            return search(embed(query), n_results, where)
+
+        generation = self.generation
+        text_key = self._text_key(query, n_results, where)
+        results = self._get(text_key)
+        if results is not None:
+            self._counters["text_hits"] += 1
+            return results
+
+        embedding = embed(query)
+        embedding_key = self._embedding_key(embedding, n_results, where)
+        results = self._get(embedding_key)
+        if results is not None:
+            self._counters["embedding_hits"] += 1
+        else:
+            self._counters["misses"] += 1
+            results = search(embedding, n_results, where)
+            self._put(embedding_key, generation, results)
+        self._put(text_key, generation, results)
+        return results
+
+    def stats(self) -> Dict:
+        """Cache size, generation and hit counters"""
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "generation": self.generation,
+            **self._counters
+        }
+
+
+def load_hot_queries(path: str, limit: int) -> List[Tuple[str, int]]:
+    """Return the most frequent (query, n_results) pairs from a query log
+
+    Each line is either a JSON object with a "query" and optional "n_results" field,
+    or a plain-text query.
+    """
+    counts: Counter = Counter()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                query = entry.get("query")
+                n_results = entry.get("n_results", 3)
+            else:
+                query, n_results = line, 3
+            if query:
+                counts[(query, n_results)] += 1
+    return [key for key, _ in counts.most_common(limit)]
+
+
+def warm_from_log(store, path: str, limit: int) -> int:
+    """Precompute and cache results for the hottest queries in a log"""
+    if not path or not os.path.exists(path):
+        return 0
+    hot_queries = load_hot_queries(path, limit)
+    for query, n_results in hot_queries:
+        store.search(query, n_results)
+    return len(hot_queries)
@@ -0,0 +1,244 @@
+"""Request scheduler with priorities, per-client fairness and admission control for LLM calls"""
+
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+from app.config import (
+    LLM_MAX_CONCURRENCY, CHAT_QUEUE_MAX_DEPTH, CHAT_QUEUE_MAX_PER_CLIENT, CHAT_REQUEST_DEADLINE
+)
+
+# Served in this order; a lower class only runs when every higher class is empty
+PRIORITIES = ("interactive", "batch")
+WAIT_SAMPLE_SIZE = 500
+SERVICE_TIME_SMOOTHING = 0.2
+
+
+class SchedulerRejected(Exception):
+    """Raised when a request is refused at admission or shed before it could run"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class _Ticket:
+    """A queued call and the future its caller is waiting on"""
+
+    def __init__(self, func: Callable, args: tuple, client_id: str, priority: str, deadline: float):
+        self.func = func
+        self.args = args
+        self.client_id = client_id
+        self.priority = priority
+        self.deadline = deadline
+        self.enqueued_at = time.monotonic()
+        self.future = asyncio.get_running_loop().create_future()
+        self.started = False
+        self.released = False
+
+
+class RequestScheduler:
+    """Runs blocking calls in worker threads with bounded concurrency and a bounded queue
+
+    Queued requests are ordered by priority class, then round-robin across clients within
+    a class. The deadline is end to end: requests are refused up front when the queue is
+    full, when a client already has too many requests outstanding, or when the estimated
+    wait plus service time would miss the deadline, and queued requests are shed when they
+    could no longer finish in time. All state is touched only from the event loop thread.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue_depth: int, max_per_client: int, deadline: float):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue_depth = max_queue_depth
+        self.max_per_client = max_per_client
+        self.deadline = deadline
+
+        self._queues: Dict[str, "OrderedDict[str, Deque[_Ticket]]"] = {p: OrderedDict() for p in PRIORITIES}
+        self._depth = 0
+        self._active = 0
+        self._outstanding: Dict[str, int] = {}
+        self._service_time: Optional[float] = None
+        self._wait_times: Deque[float] = deque(maxlen=WAIT_SAMPLE_SIZE)
+        self._counters = {"admitted": 0, "completed": 0, "failed": 0, "rejected": 0, "shed": 0}
+
+    def _queued(self, priority: str) -> int:
+        return sum(len(tickets) for tickets in self._queues[priority].values())
+
+    def _estimate_wait(self, priority: str) -> Optional[float]:
+        """Estimated queueing delay for a new request, or None before any call has completed"""
+        if self._service_time is None:
+            return None
+        ahead = self._active
+        for p in PRIORITIES:
+            ahead += self._queued(p)
+            if p == priority:
+                break
+        return (ahead // self.max_concurrency) * self._service_time
+
+    def _retry_after(self, priority: str) -> int:
+        estimate = self._estimate_wait(priority) or 0.0
+        return max(1, math.ceil(estimate + (self._service_time or 1.0)))
+
+    def _reject(self, status_code: int, detail: str, priority: str) -> SchedulerRejected:
+        self._counters["rejected"] += 1
+        return SchedulerRejected(status_code, detail, self._retry_after(priority))
+
+    def _release(self, ticket: _Ticket) -> None:
+        """Return the client's slot exactly once"""
+        if ticket.released:
+            return
+        ticket.released = True
+        remaining = self._outstanding.get(ticket.client_id, 1) - 1
+        if remaining > 0:
+            self._outstanding[ticket.client_id] = remaining
+        else:
+            self._outstanding.pop(ticket.client_id, None)
+
+    def _remove(self, ticket: _Ticket) -> None:
+        """Drop a ticket that is still waiting in the queue"""
+        clients = self._queues[ticket.priority]
+        tickets = clients.get(ticket.client_id)
+        if tickets and ticket in tickets:
+            tickets.remove(ticket)
+            self._depth -= 1
+            if not tickets:
+                del clients[ticket.client_id]
+        self._release(ticket)
+
+    def _next_ticket(self) -> Optional[_Ticket]:
+        """Pop the next ticket: highest priority first, round-robin across clients"""
+        for priority in PRIORITIES:
+            clients = self._queues[priority]
+            if not clients:
+                continue
+            client_id, tickets = next(iter(clients.items()))
+            ticket = tickets.popleft()
+            self._depth -= 1
+            if tickets:
+                clients.move_to_end(client_id)
+            else:
+                del clients[client_id]
+            return ticket
+        return None
+
+    def _start(self, ticket: _Ticket) -> None:
+        """Run a ticket on a worker slot"""
+        ticket.started = True
+        self._active += 1
+        self._wait_times.append(time.monotonic() - ticket.enqueued_at)
+        asyncio.ensure_future(self._run(ticket))
+
+    def _dispatch(self) -> None:
+        """Start queued tickets while there are free worker slots"""
+        while self._active < self.max_concurrency:
+            ticket = self._next_ticket()
+            if ticket is None:
+                return
+            if ticket.future.done():
+                self._release(ticket)
+                continue
+
+            # Running a call that cannot finish before the deadline only serves a client that gave up
+            if time.monotonic() + (self._service_time or 0.0) > ticket.deadline:
+                self._counters["shed"] += 1
+                self._release(ticket)
+                ticket.future.set_exception(
+                    SchedulerRejected(503, "Request would miss its deadline", self._retry_after(ticket.priority))
+                )
+                continue
+
+            self._start(ticket)
+
+    async def _run(self, ticket: _Ticket) -> None:
+        started_at = time.monotonic()
+        try:
+            result = await asyncio.to_thread(ticket.func, *ticket.args)
+            self._counters["completed"] += 1
+            if not ticket.future.done():
+                ticket.future.set_result(result)
+        except Exception as e:
+            self._counters["failed"] += 1
+            if not ticket.future.done():
+                ticket.future.set_exception(e)
+        finally:
+            # Clamp so one pathological call (e.g. a cold model load) cannot dominate the estimate
+            elapsed = min(time.monotonic() - started_at, self.deadline)
+            if self._service_time is None:
+                self._service_time = elapsed
+            else:
+                self._service_time += SERVICE_TIME_SMOOTHING * (elapsed - self._service_time)
+            self._active -= 1
+            self._release(ticket)
+            self._dispatch()
+
+    async def submit(self, func: Callable, *args, client_id: str, priority: str = "interactive") -> Any:
+        """Queue a blocking call and wait for its result, or raise SchedulerRejected"""
+        if priority not in self._queues:
+            raise ValueError(f"Unknown priority: {priority}")
+
+        if self._depth >= self.max_queue_depth:
+            raise self._reject(503, "Server is busy, please retry later", priority)
+        if self._outstanding.get(client_id, 0) >= self.max_per_client:
+            raise self._reject(429, "Too many concurrent requests from this client", priority)
+        # A request that can start right away is always admitted; the estimate only
+        # guards against waiting behind work that is already queued or running
+        start_now = self._depth == 0 and self._active < self.max_concurrency
+        if not start_now:
+            estimated_wait = self._estimate_wait(priority)
+            if estimated_wait is not None and estimated_wait + self._service_time > self.deadline:
+                raise self._reject(503, "Server is overloaded, please retry later", priority)
+
+        ticket = _Ticket(func, args, client_id, priority, time.monotonic() + self.deadline)
+        self._outstanding[client_id] = self._outstanding.get(client_id, 0) + 1
+        self._counters["admitted"] += 1
+        if start_now:
+            self._start(ticket)
+        else:
+            self._queues[priority].setdefault(client_id, deque()).append(ticket)
+            self._depth += 1
+            self._dispatch()
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(ticket.future), timeout=self.deadline)
+        except asyncio.TimeoutError:
+            if ticket.started:
+                # Already running on a worker; a late answer is better than a wasted call
+                return await ticket.future
+            self._remove(ticket)
+            self._counters["shed"] += 1
+            ticket.future.cancel()
+            raise SchedulerRejected(503, "Request deadline passed while queued", self._retry_after(priority))
+        except asyncio.CancelledError:
+            # The caller went away; free its queue slot if the call has not started
+            if not ticket.started:
+                self._remove(ticket)
+                ticket.future.cancel()
+            raise
+
+    def stats(self) -> Dict:
+        """Queue depth, wait times and counters"""
+        waits = sorted(self._wait_times)
+        return {
+            "queue_depth": self._depth,
+            "queued_by_priority": {p: self._queued(p) for p in PRIORITIES},
+            "active": self._active,
+            "max_concurrency": self.max_concurrency,
+            "max_queue_depth": self.max_queue_depth,
+            "avg_wait_seconds": sum(waits) / len(waits) if waits else 0.0,
+            "p95_wait_seconds": waits[int(len(waits) * 0.95)] if waits else 0.0,
+            "avg_service_seconds": self._service_time,
+            **self._counters
+        }
+
+
+# Singleton instance
+chat_scheduler = RequestScheduler(
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    max_queue_depth=CHAT_QUEUE_MAX_DEPTH,
+    max_per_client=CHAT_QUEUE_MAX_PER_CLIENT,
+    deadline=CHAT_REQUEST_DEADLINE
+)
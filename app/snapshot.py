@@ -0,0 +1,182 @@
+"""Snapshot format for exporting and restoring the knowledge base without re-embedding
+
+A snapshot is a directory containing:
+    manifest.json   - format version, row count and embedding dimension
+    embeddings.npy  - float32 array of shape (count, dimension)
+    records.jsonl   - one {"id", "document", "metadata"} object per row, same order as embeddings
+"""
+
+import json
+import os
+import shutil
+import time
+import numpy as np
+from typing import Dict, Iterator, List, Optional, Tuple
+
+SNAPSHOT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+RECORDS_FILE = "records.jsonl"
+
+
+class SnapshotWriter:
+    """Streams batches of rows into a snapshot directory"""
+
+    def __init__(self, path: str, count: int):
+        self.path = path
+        self.count = count
+        self.written = 0
+        self.dimension = 0
+        self._tmp_path = f"{path}.tmp"
+
+        if os.path.exists(self._tmp_path):
+            shutil.rmtree(self._tmp_path)
+        os.makedirs(self._tmp_path)
+
+        self._records = open(os.path.join(self._tmp_path, RECORDS_FILE), "w", encoding="utf-8")
+        self._embeddings = None
+
+    def write_batch(self, ids: List[str], documents: List[str], metadatas: List[Optional[Dict]], embeddings) -> None:
+        """Append a batch of rows to the snapshot"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        rows = min(len(ids), self.count - self.written)
+        if rows <= 0:
+            return
+
+        if self._embeddings is None:
+            # The memmap is opened lazily because the dimension is only known from the first batch
+            self.dimension = embeddings.shape[1]
+            self._embeddings = np.lib.format.open_memmap(
+                os.path.join(self._tmp_path, EMBEDDINGS_FILE),
+                mode="w+",
+                dtype=np.float32,
+                shape=(self.count, self.dimension)
+            )
+
+        self._embeddings[self.written:self.written + rows] = embeddings[:rows]
+        for i in range(rows):
+            self._records.write(json.dumps({
+                "id": ids[i],
+                "document": documents[i],
+                "metadata": metadatas[i]
+            }) + "\n")
+        self.written += rows
+
+    def close(self) -> Dict:
+        """Finalize the snapshot and atomically move it into place"""
+        self._records.close()
+        if self._embeddings is not None:
+            self._embeddings.flush()
+            del self._embeddings
+            self._embeddings = None
+        else:
+            np.save(os.path.join(self._tmp_path, EMBEDDINGS_FILE), np.zeros((0, 0), dtype=np.float32))
+
+        manifest = {
+            "version": SNAPSHOT_VERSION,
+            "count": self.written,
+            "dimension": self.dimension,
+            "created_at": time.time()
+        }
+        with open(os.path.join(self._tmp_path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+        os.replace(self._tmp_path, self.path)
+        return manifest
+
+
+def read_manifest(path: str) -> Dict:
+    """Read and validate a snapshot manifest"""
+    with open(os.path.join(path, MANIFEST_FILE), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version: {manifest.get('version')}")
+    return manifest
+
+
+def validate_snapshot(path: str, dimension: int) -> Dict:
+    """Check a snapshot is complete and matches the embedding dimension before restoring it"""
+    manifest = read_manifest(path)
+    for name in (EMBEDDINGS_FILE, RECORDS_FILE):
+        if not os.path.isfile(os.path.join(path, name)):
+            raise ValueError(f"Snapshot is missing {name}")
+
+    if manifest["count"]:
+        if manifest["dimension"] != dimension:
+            raise ValueError(
+                f"Snapshot dimension {manifest['dimension']} does not match model dimension {dimension}"
+            )
+        embeddings = np.load(os.path.join(path, EMBEDDINGS_FILE), mmap_mode="r")
+        if embeddings.ndim != 2 or embeddings.shape[0] < manifest["count"] or embeddings.shape[1] != dimension:
+            raise ValueError("Snapshot embeddings do not match its manifest")
+    return manifest
+
+
+def iter_snapshot(path: str, batch_size: int) -> Iterator[Tuple[List[str], List[str], List[Optional[Dict]], np.ndarray]]:
+    """Yield (ids, documents, metadatas, embeddings) batches from a snapshot"""
+    manifest = read_manifest(path)
+    count = manifest["count"]
+    if count == 0:
+        return
+
+    embeddings = np.load(os.path.join(path, EMBEDDINGS_FILE), mmap_mode="r")
+    with open(os.path.join(path, RECORDS_FILE), "r", encoding="utf-8") as f:
+        start = 0
+        while start < count:
+            ids, documents, metadatas = [], [], []
+            for line in f:
+                record = json.loads(line)
+                ids.append(record["id"])
+                documents.append(record["document"])
+                metadatas.append(record["metadata"])
+                if len(ids) == batch_size or start + len(ids) == count:
+                    break
+            if not ids:
+                break
+            yield ids, documents, metadatas, np.asarray(embeddings[start:start + len(ids)])
+            start += len(ids)
+
+
+def list_snapshots(snapshot_dir: str) -> List[Dict]:
+    """List snapshots stored in a directory"""
+    snapshots = []
+    if not os.path.isdir(snapshot_dir):
+        return snapshots
+    for name in sorted(os.listdir(snapshot_dir)):
+        path = os.path.join(snapshot_dir, name)
+        if name.startswith(".") or name.endswith(".tmp") or not os.path.isdir(path):
+            continue
+        try:
+            manifest = read_manifest(path)
+        except (OSError, ValueError):
+            continue
+        snapshots.append({"name": name, **manifest})
+    return snapshots
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Snapshot, restore or compact the Jarvis knowledge base")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Write the knowledge base to a snapshot directory")
+    export_parser.add_argument("path")
+    restore_parser = subparsers.add_parser("restore", help="Replace the knowledge base with a snapshot")
+    restore_parser.add_argument("path")
+    subparsers.add_parser("compact", help="Rebuild the index and reclaim space left by deletes")
+    args = parser.parse_args()
+
+    from app.vector_store import vector_store
+
+    if args.command == "export":
+        result = vector_store.export_snapshot(args.path)
+    elif args.command == "restore":
+        result = vector_store.restore_snapshot(args.path)
+    else:
+        result = vector_store.compact()
+
+    if result is None:
+        raise SystemExit(1)
+    print(json.dumps(result))
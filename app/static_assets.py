@@ -0,0 +1,132 @@
+"""In-memory cache of frontend files with precompressed variants and ETags"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+from fastapi import Request
+from fastapi.responses import Response
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+INDEX_FILE = "index.html"
+HASHED_CACHE_CONTROL = "public, max-age=31536000, immutable"
+DEFAULT_CACHE_CONTROL = "no-cache"
+MIN_COMPRESS_SIZE = 256
+
+
+class StaticAsset:
+    """A file's content, content hash and compressed variants"""
+
+    def __init__(self, content: bytes, media_type: str):
+        self.media_type = media_type
+        self.hash = hashlib.sha256(content).hexdigest()[:16]
+        self.variants: Dict[str, bytes] = {"identity": content}
+
+        if len(content) >= MIN_COMPRESS_SIZE:
+            compressed = gzip.compress(content, compresslevel=9, mtime=0)
+            if len(compressed) < len(content):
+                self.variants["gzip"] = compressed
+            if brotli is not None:
+                compressed = brotli.compress(content, quality=11)
+                if len(compressed) < len(content):
+                    self.variants["br"] = compressed
+
+    def etag(self, encoding: str) -> str:
+        """Strong ETag; each encoding is a distinct representation"""
+        if encoding == "identity":
+            return f'"{self.hash}"'
+        return f'"{self.hash}-{encoding}"'
+
+
+def _accepted_encodings(header: str) -> List[Tuple[str, float]]:
+    """Parse an Accept-Encoding header into (encoding, q) pairs"""
+    encodings = []
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        encodings.append((token.strip().lower(), q))
+    return encodings
+
+
+class StaticAssetCache:
+    """Loads the frontend directory once at startup and serves it from memory
+
+    `index.html` references the other assets with a `?v=<content hash>` query, so those
+    URLs can be cached indefinitely; everything else is revalidated with its ETag.
+    Changes to the frontend files take effect after a restart.
+    """
+
+    def __init__(self, directory: str):
+        self.assets: Dict[str, StaticAsset] = {}
+        if not os.path.isdir(directory):
+            return
+
+        contents = {}
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if os.path.isfile(path) and not name.startswith("."):
+                with open(path, "rb") as f:
+                    contents[name] = f.read()
+
+        for name, content in contents.items():
+            if name != INDEX_FILE:
+                self.assets[name] = StaticAsset(content, self._media_type(name))
+
+        if INDEX_FILE in contents:
+            html = contents[INDEX_FILE].decode("utf-8")
+            for name, asset in self.assets.items():
+                html = html.replace(f'"{name}"', f'"{name}?v={asset.hash}"')
+            self.assets[INDEX_FILE] = StaticAsset(html.encode("utf-8"), "text/html")
+
+    @staticmethod
+    def _media_type(name: str) -> str:
+        media_type, _ = mimetypes.guess_type(name)
+        return media_type or "application/octet-stream"
+
+    @staticmethod
+    def _negotiate(header: str, asset: StaticAsset) -> str:
+        """Pick the best precompressed variant the client accepts"""
+        accepted = {encoding: q for encoding, q in _accepted_encodings(header)}
+        wildcard = accepted.get("*", 0.0)
+        for encoding in ("br", "gzip"):
+            if encoding in asset.variants and accepted.get(encoding, wildcard) > 0:
+                return encoding
+        return "identity"
+
+    def response(self, filename: str, request: Request) -> Optional[Response]:
+        """Build the response for a cached file, or None if it does not exist"""
+        asset = self.assets.get(filename)
+        if asset is None:
+            return None
+
+        encoding = self._negotiate(request.headers.get("accept-encoding", ""), asset)
+        hashed = filename != INDEX_FILE and request.query_params.get("v") == asset.hash
+        headers = {
+            "ETag": asset.etag(encoding),
+            "Cache-Control": HASHED_CACHE_CONTROL if hashed else DEFAULT_CACHE_CONTROL,
+            "Vary": "Accept-Encoding"
+        }
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            # Weak comparison (RFC 9110): ignore W/ but match the full tag, encoding suffix included
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            if "*" in tags or headers["ETag"] in tags:
+                return Response(status_code=304, headers=headers)
+
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(content=asset.variants[encoding], media_type=asset.media_type, headers=headers)
@@ -5,8 +5,16 @@ from chromadb.config import Settings
 from sentence_transformers import SentenceTransformer
 from typing import List, Dict, Optional
 import os
+import shutil
+import sqlite3
+import threading
 
-from app.config import CHROMA_PERSIST_DIR, COLLECTION_NAME, EMBEDDING_MODEL
+from app.config import (
+    CHROMA_PERSIST_DIR, COLLECTION_NAME, EMBEDDING_MODEL,
+    SNAPSHOT_DIR, SNAPSHOT_BATCH_SIZE, VECTOR_BACKEND
+)
+from app.retrieval_cache import RetrievalCache
+from app.snapshot import SnapshotWriter, iter_snapshot, validate_snapshot
 
 
 class VectorStore:
@@ -28,6 +36,12 @@ class VectorStore:
         # Initialize embedding model
         self.embedding_model = SentenceTransformer(EMBEDDING_MODEL)
 
+        # Search results are cached until the next write
+        self.result_cache = RetrievalCache()
+
+        # Serializes writes so restore and compaction cannot interleave with adds or deletes
+        self._write_lock = threading.RLock()
+
     def _get_embeddings(self, texts: List[str]) -> List[List[float]]:
         """Generate embeddings for given texts"""
         embeddings = self.embedding_model.encode(texts)
@@ -36,68 +50,86 @@ class VectorStore:
     def add_knowledge(self, documents: List[str], metadatas: Optional[List[Dict]] = None, ids: Optional[List[str]] = None) -> bool:
         """Add documents to the knowledge base"""
         try:
-            if ids is None:
-                # Generate unique IDs
-                existing_count = self.collection.count()
-                ids = [f"doc_{existing_count + i}" for i in range(len(documents))]
-
             if metadatas is None:
                 metadatas = [{"source": "user_input"} for _ in documents]
 
             # Generate embeddings
             embeddings = self._get_embeddings(documents)
 
-            # Add to collection
-            self.collection.add(
-                documents=documents,
-                embeddings=embeddings,
-                metadatas=metadatas,
-                ids=ids
-            )
+            with self._write_lock:
+                if ids is None:
+                    # Generate unique IDs
+                    existing_count = self.collection.count()
+                    ids = [f"doc_{existing_count + i}" for i in range(len(documents))]
+
+                # Add to collection
+                self.collection.add(
+                    documents=documents,
+                    embeddings=embeddings,
+                    metadatas=metadatas,
+                    ids=ids
+                )
+                self.result_cache.bump()
             return True
         except Exception as e:
             print(f"Error adding knowledge: {e}")
             return False
 
-    def search(self, query: str, n_results: int = 3) -> List[Dict]:
-        """Search for relevant documents based on query"""
+    def _embed_query(self, query: str) -> List[float]:
+        """Generate the embedding for a single query"""
+        return self._get_embeddings([query])[0]
+
+    def _query(self, query_embedding: List[float], n_results: int, where: Optional[Dict]) -> List[Dict]:
+        """Run a nearest-neighbour query against the collection"""
+        results = self.collection.query(
+            query_embeddings=[query_embedding],
+            n_results=n_results,
+            where=where or None
+        )
+
+        # Format results
+        formatted_results = []
+        if results and results['documents']:
+            for i, doc in enumerate(results['documents'][0]):
+                formatted_results.append({
+                    "id": results['ids'][0][i],
+                    "document": doc,
+                    "metadata": results['metadatas'][0][i] if results['metadatas'] else {},
+                    "distance": results['distances'][0][i] if results['distances'] else None
+                })
+
+        return formatted_results
+
+    def search(self, query: str, n_results: int = 3, where: Optional[Dict] = None) -> List[Dict]:
+        """Search for relevant documents based on query, optionally filtered by metadata"""
         try:
-            # Generate query embedding
-            query_embedding = self._get_embeddings([query])[0]
-
-            # Search in collection
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=n_results
-            )
-
-            # Format results
-            formatted_results = []
-            if results and results['documents']:
-                for i, doc in enumerate(results['documents'][0]):
-                    formatted_results.append({
-                        "document": doc,
-                        "metadata": results['metadatas'][0][i] if results['metadatas'] else {},
-                        "distance": results['distances'][0][i] if results['distances'] else None
-                    })
-
-            return formatted_results
+            return self.result_cache.get_or_compute(query, n_results, where, self._embed_query, self._query)
         except Exception as e:
             print(f"Error searching: {e}")
             return []
 
-    def get_all_documents(self) -> Dict:
-        """Retrieve all documents from the knowledge base"""
+    def get_all_documents(self, limit: Optional[int] = None, offset: Optional[int] = None) -> Dict:
+        """Retrieve all documents from the knowledge base, optionally one page at a time"""
         try:
-            return self.collection.get()
+            return self.collection.get(limit=limit, offset=offset)
         except Exception as e:
             print(f"Error retrieving documents: {e}")
             return {}
 
+    def count(self) -> int:
+        """Return the number of documents in the knowledge base"""
+        try:
+            return self.collection.count()
+        except Exception as e:
+            print(f"Error counting documents: {e}")
+            return 0
+
     def delete_document(self, doc_id: str) -> bool:
         """Delete a document by ID"""
         try:
-            self.collection.delete(ids=[doc_id])
+            with self._write_lock:
+                self.collection.delete(ids=[doc_id])
+                self.result_cache.bump()
             return True
         except Exception as e:
             print(f"Error deleting document: {e}")
@@ -106,17 +138,128 @@ class VectorStore:
     def clear_all(self) -> bool:
         """Clear all documents from the knowledge base"""
         try:
-            # Delete and recreate collection
-            self.client.delete_collection(COLLECTION_NAME)
-            self.collection = self.client.get_or_create_collection(
-                name=COLLECTION_NAME,
-                metadata={"description": "Jarvis AI knowledge base"}
-            )
+            with self._write_lock:
+                # Delete and recreate collection
+                self.client.delete_collection(COLLECTION_NAME)
+                self.collection = self.client.get_or_create_collection(
+                    name=COLLECTION_NAME,
+                    metadata={"description": "Jarvis AI knowledge base"}
+                )
+                self.result_cache.bump()
             return True
         except Exception as e:
             print(f"Error clearing knowledge base: {e}")
             return False
 
+    def _batch_size(self) -> int:
+        """Largest batch Chroma accepts in a single call, capped by the snapshot batch size"""
+        max_batch_size = getattr(self.client, "max_batch_size", None)
+        if max_batch_size:
+            return min(max_batch_size, SNAPSHOT_BATCH_SIZE)
+        return SNAPSHOT_BATCH_SIZE
+
+    def export_snapshot(self, path: str) -> Optional[Dict]:
+        """Write ids, documents, metadata and raw embeddings to a snapshot directory"""
+        try:
+            # Pages are offsets into the collection, so writes must not shift them mid-export
+            with self._write_lock:
+                count = self.collection.count()
+                batch_size = self._batch_size()
+                writer = SnapshotWriter(path, count)
+
+                offset = 0
+                while offset < count:
+                    batch = self.collection.get(
+                        include=["documents", "metadatas", "embeddings"],
+                        limit=batch_size,
+                        offset=offset
+                    )
+                    if not batch["ids"]:
+                        break
+                    writer.write_batch(batch["ids"], batch["documents"], batch["metadatas"], batch["embeddings"])
+                    offset += len(batch["ids"])
+
+                return writer.close()
+        except Exception as e:
+            print(f"Error exporting snapshot: {e}")
+            return None
+
+    def restore_snapshot(self, path: str) -> Optional[Dict]:
+        """Replace the knowledge base with a snapshot, reusing its stored embeddings
+
+        The snapshot is loaded into a staging collection that replaces the live one only once
+        it is complete, so searches never see an empty or partially restored knowledge base.
+        """
+        staging_name = f"{COLLECTION_NAME}_staging"
+        try:
+            # Validate before touching any collection so a bad snapshot fails cleanly
+            validate_snapshot(path, self.embedding_model.get_sentence_embedding_dimension())
+
+            with self._write_lock:
+                try:
+                    self.client.delete_collection(staging_name)
+                except Exception:
+                    pass  # No leftover staging collection
+                staging = self.client.get_or_create_collection(
+                    name=staging_name,
+                    metadata={"description": "Jarvis AI knowledge base"}
+                )
+
+                restored = 0
+                try:
+                    for ids, documents, metadatas, embeddings in iter_snapshot(path, self._batch_size()):
+                        staging.add(
+                            documents=documents,
+                            embeddings=embeddings.tolist(),
+                            metadatas=metadatas,
+                            ids=ids
+                        )
+                        restored += len(ids)
+                except Exception:
+                    self.client.delete_collection(staging_name)
+                    raise
+
+                # Swap: searches move to the staged collection before the old one is dropped
+                self.collection = staging
+                self.client.delete_collection(COLLECTION_NAME)
+                staging.modify(name=COLLECTION_NAME)
+                self.result_cache.bump()
+
+            return {"count": restored}
+        except Exception as e:
+            print(f"Error restoring snapshot: {e}")
+            return None
+
+    def compact(self) -> Optional[Dict]:
+        """Rebuild the collection from a temporary snapshot to drop fragmentation left by deletes"""
+        path = os.path.join(SNAPSHOT_DIR, ".compact")
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+
+        # Hold the write lock from export to swap so no add or delete is lost in between
+        with self._write_lock:
+            if self.export_snapshot(path) is None:
+                return None
+            result = self.restore_snapshot(path)
+            if result is None:
+                # Keep the temporary snapshot so the data can still be restored by hand
+                print(f"Compaction failed, snapshot kept at {path}")
+                return None
+            shutil.rmtree(path, ignore_errors=True)
+
+            try:
+                # Deleted rows leave free pages behind in Chroma's SQLite file
+                connection = sqlite3.connect(os.path.join(CHROMA_PERSIST_DIR, "chroma.sqlite3"))
+                connection.execute("VACUUM")
+                connection.close()
+            except Exception as e:
+                print(f"Error vacuuming database: {e}")
+
+        return result
+
 
 # Singleton instance
-vector_store = VectorStore()
+if VECTOR_BACKEND == "mmap":
+    from app.mmap_store import MmapVectorStore
+    vector_store = MmapVectorStore()
+else:
+    vector_store = VectorStore()
@@ -1,11 +1,17 @@
 """Streamlit Chatbot UI for Jarvis AI Assistant"""
 
+import math
+import uuid
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
 from typing import Optional
 
 # Configuration
 API_BASE_URL = "http://localhost:8000"
+STATUS_CACHE_TTL = 15  # seconds
+KNOWLEDGE_CACHE_TTL = 60  # seconds
+KNOWLEDGE_PAGE_SIZE = 20
 
 # Page configuration
 st.set_page_config(
@@ -41,24 +47,65 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
+@st.cache_resource
+def get_session() -> requests.Session:
+    """Pooled HTTP session shared across reruns"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=10)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+@st.cache_data(ttl=STATUS_CACHE_TTL, show_spinner=False)
+def _fetch_status() -> dict:
+    """Fetch API status; failures raise so they are not cached"""
+    response = get_session().get(f"{API_BASE_URL}/api/status", timeout=5)
+    response.raise_for_status()
+    return response.json()
+
+
+@st.cache_data(ttl=KNOWLEDGE_CACHE_TTL, show_spinner=False)
+def _fetch_knowledge(offset: int, limit: int) -> dict:
+    """Fetch one page of knowledge; failures raise so they are not cached"""
+    response = get_session().get(
+        f"{API_BASE_URL}/api/knowledge",
+        params={"offset": offset, "limit": limit},
+        timeout=10
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def invalidate_cache():
+    """Drop cached status and knowledge after the knowledge base changes"""
+    _fetch_status.clear()
+    _fetch_knowledge.clear()
+
+
 def check_api_status() -> Optional[dict]:
     """Check if the API is running and get status"""
     try:
-        response = requests.get(f"{API_BASE_URL}/api/status", timeout=5)
-        response.raise_for_status()
-        return response.json()
+        return _fetch_status()
     except:
         return None
 
 
 def send_message(message: str, use_knowledge_base: bool = True) -> Optional[dict]:
-    """Send a message to the API and get response"""
+    """Send a message to the API and get response; a busy server returns {"error": message}"""
     try:
-        response = requests.post(
+        # Every UI user reaches the API from this server's address, so identify the browser session
+        response = get_session().post(
             f"{API_BASE_URL}/api/chat",
             json={"message": message, "use_knowledge_base": use_knowledge_base},
+            headers={"X-Client-ID": st.session_state.client_id},
             timeout=120
         )
+        if response.status_code in (429, 503):
+            retry_after = response.headers.get("Retry-After", "a few")
+            if response.status_code == 429:
+                return {"error": f"You already have several messages in progress. Please try again in {retry_after} seconds."}
+            return {"error": f"Jarvis is busy right now. Please try again in {retry_after} seconds."}
         response.raise_for_status()
         return response.json()
     except Exception as e:
@@ -69,24 +116,23 @@ def send_message(message: str, use_knowledge_base: bool = True) -> Optional[dict
 def add_knowledge(documents: list) -> bool:
     """Add documents to knowledge base"""
     try:
-        response = requests.post(
+        response = get_session().post(
             f"{API_BASE_URL}/api/knowledge/add",
             json={"documents": documents},
             timeout=30
         )
         response.raise_for_status()
+        invalidate_cache()
         return True
     except Exception as e:
         st.error(f"Error adding knowledge: {str(e)}")
         return False
 
 
-def get_knowledge() -> Optional[dict]:
-    """Get all knowledge from database"""
+def get_knowledge(offset: int = 0, limit: int = KNOWLEDGE_PAGE_SIZE) -> Optional[dict]:
+    """Get one page of knowledge from database"""
     try:
-        response = requests.get(f"{API_BASE_URL}/api/knowledge", timeout=10)
-        response.raise_for_status()
-        return response.json()
+        return _fetch_knowledge(offset, limit)
     except:
         return None
 
@@ -94,8 +140,9 @@ def get_knowledge() -> Optional[dict]:
 def clear_knowledge() -> bool:
     """Clear all knowledge from database"""
     try:
-        response = requests.delete(f"{API_BASE_URL}/api/knowledge", timeout=10)
+        response = get_session().delete(f"{API_BASE_URL}/api/knowledge", timeout=10)
         response.raise_for_status()
+        invalidate_cache()
         return True
     except:
         return False
@@ -108,6 +155,12 @@ if "messages" not in st.session_state:
 if "knowledge_count" not in st.session_state:
     st.session_state.knowledge_count = 0
 
+if "knowledge_page" not in st.session_state:
+    st.session_state.knowledge_page = 1
+
+if "client_id" not in st.session_state:
+    st.session_state.client_id = str(uuid.uuid4())
+
 
 # Main UI
 st.title("🤖 Jarvis AI Assistant")
@@ -182,7 +235,7 @@ with tab1:
             with st.spinner("Thinking..."):
                 response = send_message(prompt, use_kb)
 
-                if response:
+                if response and "error" not in response:
                     assistant_message = response.get("response", "Sorry, I couldn't generate a response.")
                     st.markdown(assistant_message)
 
@@ -200,7 +253,7 @@ with tab1:
                         "retrieved_docs": response.get("retrieved_documents", [])
                     })
                 else:
-                    error_msg = "Failed to get response. Please check if the API and Ollama are running."
+                    error_msg = (response or {}).get("error") or "Failed to get response. Please check if the API and Ollama are running."
                     st.error(error_msg)
                     st.session_state.messages.append({
                         "role": "assistant",
@@ -237,18 +290,35 @@ with tab2:
 
     # View current knowledge
     st.markdown("### Current Knowledge")
-    knowledge = get_knowledge()
+    offset = (st.session_state.knowledge_page - 1) * KNOWLEDGE_PAGE_SIZE
+    knowledge = get_knowledge(offset=offset)
 
     if knowledge and knowledge.get("count", 0) > 0:
+        total_pages = max(1, math.ceil(knowledge.get("count", 0) / KNOWLEDGE_PAGE_SIZE))
+        if st.session_state.knowledge_page > total_pages:
+            # The knowledge base shrank since this page was selected
+            st.session_state.knowledge_page = total_pages
+            offset = (total_pages - 1) * KNOWLEDGE_PAGE_SIZE
+            knowledge = get_knowledge(offset=offset) or knowledge
+
         st.info(f"📊 Total documents: {knowledge.get('count', 0)}")
 
         docs = knowledge.get("documents", {})
         if docs.get("documents"):
             for i, (doc_id, doc_text) in enumerate(zip(docs.get("ids", []), docs.get("documents", []))):
-                with st.expander(f"Document {i+1}: {doc_text[:50]}..."):
+                with st.expander(f"Document {offset + i + 1}: {doc_text[:50]}..."):
                     st.markdown(doc_text)
                     st.caption(f"ID: {doc_id}")
 
+        if total_pages > 1:
+            st.number_input(
+                f"Page (of {total_pages})",
+                min_value=1,
+                max_value=total_pages,
+                step=1,
+                key="knowledge_page"
+            )
+
         # Clear knowledge base
         st.markdown("---")
         if st.button("🗑️ Clear All Knowledge", type="secondary"):